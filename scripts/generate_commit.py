@@ -1,34 +1,230 @@
+import argparse
+import asyncio
+import fnmatch
+import functools
+import hashlib
 import os
+import shlex
+import tempfile
+import textwrap
+import threading
+import time
 import subprocess
-import requests
 import json
 import re
+from collections import defaultdict
 from rich.console import Console
-from rich.panel import Panel
-from rich.syntax import Syntax
-from rich.prompt import Confirm
-from rich.text import Text
+from rich.markup import escape
 from dotenv import load_dotenv
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
 console = Console()
 
-def get_diff():
-    return subprocess.check_output(['git', 'diff', '--staged']).decode('utf-8')
+_PARTIAL_TITLE_RE = re.compile(r'"title"\s*:\s*"((?:[^"\\]|\\.)*)')
+_JSON_STRUCTURE_RE = re.compile(r'[{}"\\]')
+# Gitemoji titles start with an emoji, i.e. a non-ASCII character
+_LEADING_EMOJI_RE = re.compile(r'^[^\x00-\x7f]')
 
-def get_changed_files():
-    return subprocess.check_output(['git', 'diff', '--staged', '--name-only']).decode('utf-8').splitlines()
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+OPENAI_MODEL = "gpt-4o"
+# gpt-4o has a 128k context; leave headroom for the completions themselves
+MAX_PROMPT_TOKENS = 120_000
+TITLE_MAX_LENGTH = 50
 
-def generate_prompt(diff, changed_files):
-    files_summary = ", ".join(changed_files[:3])
-    if len(changed_files) > 3:
-        files_summary += f" and {len(changed_files) - 3} more"
+# Files whose diffs are noise to the model: lockfiles, minified bundles, build output
+DIFF_SKIP_GLOBS = ("*.lock", "*.lockb", "*-lock.json", "*.min.js", "*.min.css", "dist/*")
 
-    return f"""Generate a structured commit message for the following git diff, following the semantic commit and gitemoji conventions:
+_DIFF_FILE_RE = re.compile(rb'^(?=diff --git )', re.MULTILINE)
+_DIFF_HUNK_RE = re.compile(rb'^(?=@@ )', re.MULTILINE)
+# Git C-quotes paths with special or non-ASCII characters: "a/\303\244.txt"
+_QUOTED_PATH_RE = re.compile(rb'"((?:[^"\\]|\\.)*)"')
+_PATH_ESCAPE_RE = re.compile(rb'\\(?:([0-7]{3})|(.))', re.DOTALL)
+_PATH_ESCAPES = {b'a': b'\a', b'b': b'\b', b't': b'\t', b'n': b'\n', b'v': b'\v', b'f': b'\f', b'r': b'\r'}
 
-Files changed: {files_summary}
+CACHE_DIR = os.path.join(
+    os.getenv('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'schema-weaver', 'commitmsgs'
+)
 
-```
-{diff}
+# Statuses worth retrying: rate limits and transient server errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.3
+
+# Shared client so one TLS connection (multiplexed over HTTP/2 when h2 is installed) serves every request
+_CLIENT = None
+# --split calls _get_client from worker threads; without the lock each could build its own client
+_CLIENT_LOCK = threading.Lock()
+
+def _get_client():
+    # httpx is the slowest import by far, so only pay for it once a request is actually made
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            import httpx
+            try:
+                import h2  # noqa: F401  (only needed for httpx's HTTP/2 support)
+                http2 = True
+            except ImportError:
+                http2 = False
+
+            _CLIENT = httpx.Client(
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                transport=httpx.HTTPTransport(
+                    http2=http2,
+                    limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+                    retries=MAX_RETRIES,
+                ),
+            )
+        return _CLIENT
+
+async def _git(*args):
+    # Read-only plumbing: skip optional index refreshes so concurrent git commands are not blocked
+    env = {**os.environ, 'GIT_OPTIONAL_LOCKS': '0'}
+    proc = await asyncio.create_subprocess_exec('git', *args, stdout=asyncio.subprocess.PIPE, env=env)
+    stdout, _ = await proc.communicate()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, ['git', *args], output=stdout)
+    return stdout
+
+async def get_staged_changes():
+    """Return (changed_files, diff) for the staging area from a single git invocation."""
+    # --patch-with-raw -z prints NUL-separated raw records, an empty record, then the patch
+    # -U1 and disabled color, external drivers and rename detection keep the patch small for the prompt
+    output = await _git(
+        'diff', '--staged', '--patch-with-raw', '-z',
+        '-U1', '--no-color', '--no-ext-diff', '--no-renames',
+        # Pin the prefixes so _diff_path can rely on them whatever diff.noprefix/mnemonicPrefix say
+        '--src-prefix=a/', '--dst-prefix=b/',
+    )
+    raw, _, patch = output.partition(b'\0\0')
+
+    changed_files = []
+    fields = raw.split(b'\0') if raw else []
+    i = 0
+    while i < len(fields):
+        # Each record is ":<modes> <shas> <status>" followed by one path, or two for renames/copies
+        status = fields[i].rsplit(b' ', 1)[-1]
+        path_count = 2 if status[:1] in (b'R', b'C') else 1
+        # Names are only displayed and sent to the model, so undecodable bytes are replaced, not fatal
+        changed_files.append(fields[i + path_count].decode('utf-8', 'replace'))
+        i += path_count + 1
+
+    # The patch stays as bytes; it is decoded once when the prompt is assembled
+    return changed_files, patch
+
+def _unquote_path(quoted):
+    def unescape(match):
+        if match.group(1):
+            return bytes([int(match.group(1), 8)])
+        return _PATH_ESCAPES.get(match.group(2), match.group(2))
+    return _PATH_ESCAPE_RE.sub(unescape, quoted)
+
+def _diff_path(file_diff):
+    """Return the path named by a "diff --git a/<path> b/<path>" header."""
+    header = file_diff.split(b'\n', 1)[0][len(b'diff --git '):]
+    match = _QUOTED_PATH_RE.match(header)
+    if match:
+        path = _unquote_path(match.group(1))[len(b'a/'):]
+    else:
+        # Without renames both sides name the same path, so the header is "a/" + path + " b/" + path
+        path = header[len(b'a/'):(len(header) - len(b' b/') + len(b'a/')) // 2]
+    return path.decode('utf-8', 'replace')
+
+def cluster_diff(diff):
+    """Group a diff by top-level directory, returning (cluster, files, diff) tuples, largest first."""
+    clusters = defaultdict(list)
+    for file_diff in _DIFF_FILE_RE.split(diff):
+        if not file_diff:
+            continue
+        path = _diff_path(file_diff)
+        # Files at the repository root share one cluster instead of one each
+        cluster = path.split('/', 1)[0] if '/' in path else '(root)'
+        clusters[cluster].append((path, file_diff))
+
+    grouped = [
+        (cluster, [path for path, _ in entries], b"".join(file_diff for _, file_diff in entries))
+        for cluster, entries in clusters.items()
+    ]
+    return sorted(grouped, key=lambda group: len(group[2]), reverse=True)
+
+def summarize_diff(diff, max_bytes=8192, skip_globs=DIFF_SKIP_GLOBS, max_hunks=3):
+    """Shrink a diff for the prompt by skipping noisy files and eliding hunks past the budget."""
+    parts = []
+    size = 0
+    for file_diff in _DIFF_FILE_RE.split(diff):
+        if not file_diff:
+            continue
+
+        header = file_diff.split(b'\n', 1)[0]
+        path = _diff_path(file_diff)
+        if any(fnmatch.fnmatch(path, pattern) for pattern in skip_globs):
+            parts.append(header + b"\n... generated file, diff omitted ...\n")
+            continue
+
+        preamble, *hunks = _DIFF_HUNK_RE.split(file_diff)
+        kept = [preamble]
+        size += len(preamble)
+        elided = 0
+        for index, hunk in enumerate(hunks):
+            if index < max_hunks and size + len(hunk) <= max_bytes:
+                kept.append(hunk)
+                size += len(hunk)
+            else:
+                elided += hunk.count(b'\n')
+        if elided:
+            kept.append(f"... {elided} lines elided ...\n".encode('utf-8'))
+        parts.append(b"".join(kept))
+
+    return b"".join(parts)
+
+@functools.lru_cache(maxsize=None)
+def _get_encoder():
+    # Building the encoder is expensive, so it is created once and shared by every prompt
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(OPENAI_MODEL)
+    except Exception:
+        # Missing package, a tiktoken too old to know the model, or no network to fetch the BPE file:
+        # fall back to the byte estimate rather than abort the run
+        return None
+
+def count_tokens(text):
+    encoder = _get_encoder()
+    if encoder is None:
+        # Without tiktoken, assume a conservative three bytes per token
+        return len(text.encode('utf-8')) // 3
+    return len(encoder.encode(text, disallowed_special=()))
+
+def _exceeds_token_limit(prompt, max_tokens):
+    # Every token covers at least one byte, so short prompts never need the tokenizer loaded
+    return len(prompt.encode('utf-8')) > max_tokens and count_tokens(prompt) > max_tokens
+
+def _shrink_diff(diff):
+    """Omit the largest file's diff, or halve the diff once only one file is left."""
+    files = [file_diff for file_diff in _DIFF_FILE_RE.split(diff) if file_diff]
+    largest = max(range(len(files)), key=lambda index: len(files[index]))
+    stub = files[largest].split(b'\n', 1)[0] + b"\n... diff omitted to fit the context window ...\n"
+    if len(files) > 1 and len(stub) < len(files[largest]):
+        files[largest] = stub
+        return b"".join(files)
+    return diff[:len(diff) // 2]
+
+# The instructions never change, so they are encoded once and only the file list and diff are spliced in
+_PROMPT_PREFIX = (
+    "Generate a structured commit message for the following git diff, "
+    "following the semantic commit and gitemoji conventions:\n\nFiles changed: "
+).encode('utf-8')
+_PROMPT_DIFF_OPEN = b"\n\n```\n"
+_PROMPT_SUFFIX = """
 ```
 
 Requirements:
@@ -37,94 +233,396 @@ Requirements:
 3. Summary: A brief sentence summarizing the overall impact of the changes.
 
 Respond in the following JSON format:
-{{
+{
     "title": "Your commit message title here",
-    "body": {{
-        "Category1": {{
+    "body": {
+        "Category1": {
             "emoji": "🔧",
             "changes": [
                 "First change in category 1",
                 "Second change in category 1"
             ]
-        }},
-        "Category2": {{
+        },
+        "Category2": {
             "emoji": "✨",
             "changes": [
                 "First change in category 2",
                 "Second change in category 2"
             ]
-        }}
-    }},
+        }
+    },
     "summary": "A brief summary of the overall changes and their impact."
-}}
+}
 
 Ensure that each category and change is relevant and specific to the diff provided. Use appropriate and varied emojis for different categories.
-"""
+""".encode('utf-8')
+
+def generate_prompt(diff, changed_files, max_tokens=MAX_PROMPT_TOKENS):
+    files_summary = ", ".join(changed_files[:3])
+    if len(changed_files) > 3:
+        files_summary += f" and {len(changed_files) - 3} more"
+
+    header = _PROMPT_PREFIX + files_summary.encode('utf-8') + _PROMPT_DIFF_OPEN
+    # Join the raw diff bytes in place and decode the whole prompt exactly once
+    prompt = b"".join([header, diff, _PROMPT_SUFFIX]).decode('utf-8', 'replace')
+    # Trim locally rather than have the API reject an oversized prompt after a full round trip
+    while diff and _exceeds_token_limit(prompt, max_tokens):
+        diff = _shrink_diff(diff)
+        prompt = b"".join([header, diff, _PROMPT_SUFFIX]).decode('utf-8', 'replace')
+    return prompt
+
+class JsonObjectAccumulator:
+    """Collects streamed text and detects when the first top-level JSON object closes."""
+
+    def __init__(self):
+        self.text = ""
+        self.start = -1
+        self.end = -1
+        self._depth = 0
+        self._in_string = False
+        self._escaped_at = -1
+
+    def feed(self, chunk):
+        """Append a chunk and return True once the first JSON object is complete."""
+        offset = len(self.text)
+        self.text += chunk
+        if self.end >= 0:
+            return True
+        # Only braces, quotes and backslashes change the scanner state, so let the regex skip the rest
+        for match in _JSON_STRUCTURE_RE.finditer(self.text, offset):
+            i = match.start()
+            char = match.group()
+            if self.start < 0:
+                if char == '{':
+                    self.start = i
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if i == self._escaped_at:
+                    continue
+                if char == '\\':
+                    self._escaped_at = i + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = i + 1
+                    return True
+        return False
+
+    @property
+    def result(self):
+        if self.end < 0:
+            return None
+        return self.text[self.start:self.end]
 
-def generate_commit_message(prompt):
+def _cache_path(model, prompt):
+    key = hashlib.blake2b(f"{model}\0{prompt}".encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+def read_cached_message(path):
+    # Default TTL of one week, configurable via the environment
+    ttl = int(os.getenv('COMMIT_CACHE_TTL', 7 * 24 * 3600))
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            return None
+        with open(path, encoding='utf-8') as f:
+            content = f.read()
+        # Refresh atime so recently used entries are easy to tell apart when pruning
+        os.utime(path, (time.time(), os.path.getmtime(path)))
+        return content
+    except OSError:
+        return None
+
+def write_cached_message(path, content):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    except OSError:
+        # The cache is best effort; a failed write must never break commit generation
+        return
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Don't leave half-written temporary files behind in the cache directory
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+def _api_headers():
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
         raise ValueError("OPENAI_API_KEY environment variable is not set.")
 
-    headers = {
+    return {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}"
     }
 
+def _post_completion(headers, data):
+    """POST a completion request with a lazily read body, retrying rate limits and transient errors."""
+    client = _get_client()
+    for attempt in range(MAX_RETRIES + 1):
+        request = client.build_request("POST", OPENAI_CHAT_URL, headers=headers, content=_json_dumps(data))
+        response = client.send(request, stream=True)
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            response.close()
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+            continue
+        if response.is_error:
+            response.close()
+            response.raise_for_status()
+        return response
+
+def score_candidate(content):
+    """Rate a generated message against the prompt's requirements; -1 means it is unusable."""
+    try:
+        commit_data = _json_loads(content)
+    except json.JSONDecodeError:
+        return -1
+
+    # Reject anything format_commit_message could not render
+    if not isinstance(commit_data, dict):
+        return -1
+    title = commit_data.get('title')
+    body = commit_data.get('body')
+    if not isinstance(title, str) or not isinstance(commit_data.get('summary'), str) or not isinstance(body, dict):
+        return -1
+    categories = body.values()
+    if not all(
+        isinstance(category, dict)
+        and isinstance(category.get('emoji'), str)
+        and isinstance(category.get('changes'), list)
+        for category in categories
+    ):
+        return -1
+
+    score = 0
+    if len(title) <= TITLE_MAX_LENGTH:
+        score += 2
+    if _LEADING_EMOJI_RE.match(title):
+        score += 1
+    if categories and all(2 <= len(category['changes']) <= 3 for category in categories):
+        score += 1
+    return score
+
+def generate_commit_message(prompt, on_progress=None, use_cache=True, candidates=3):
+    cache_path = _cache_path(OPENAI_MODEL, prompt)
+    if use_cache:
+        cached = read_cached_message(cache_path)
+        if cached is not None:
+            return cached
+
+    headers = _api_headers()
+
     data = {
-        "model": "gpt-4o",
-        "messages": [{"role": "user", "content": prompt}]
+        "model": OPENAI_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "n": candidates,
+        "stream": True
     }
 
-    response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=data)
-    response.raise_for_status()
-    
-    content = response.json()['choices'][0]['message']['content']
-    content = re.search(r'\{.*\}', content, re.DOTALL).group()
+    # One request returns every candidate; deltas for each are tagged with the choice index
+    accumulators = [JsonObjectAccumulator() for _ in range(candidates)]
+    response = _post_completion(headers, data)
+    try:
+        # Server-sent events: one "data: {...}" frame per delta, terminated by "data: [DONE]"
+        for line in response.iter_lines():
+            if not line.startswith("data: "):
+                continue
+            payload = line[len("data: "):]
+            if payload == "[DONE]":
+                break
+
+            for choice in _json_loads(payload).get('choices') or []:
+                delta = choice['delta'].get('content')
+                if not delta:
+                    continue
+                accumulator = accumulators[choice['index']]
+                accumulator.feed(delta)
+                if on_progress and choice['index'] == 0:
+                    on_progress(accumulator.text)
+
+            if all(accumulator.result is not None for accumulator in accumulators):
+                break
+    finally:
+        response.close()
+
+    results = [accumulator.result for accumulator in accumulators if accumulator.result is not None]
+    if not results:
+        raise ValueError("No JSON object found in the generated response.")
+
+    content = max(results, key=score_candidate)
+    # Only cache responses that parse, so a malformed answer is not replayed
+    if score_candidate(content) >= 0:
+        commit_data = _json_loads(content)
+        # Fit the title before caching so a cache hit never needs another request to shorten it
+        if len(commit_data['title']) > TITLE_MAX_LENGTH:
+            commit_data['title'] = fit_title(commit_data['title'])
+            content = _json_dumps(commit_data).decode('utf-8')
+        if use_cache:
+            write_cached_message(cache_path, content)
     return content
 
+def request_shorter_title(title, max_length=TITLE_MAX_LENGTH):
+    """Ask the model to shorten only the title, a fraction of the tokens of a full regeneration."""
+    data = {
+        "model": OPENAI_MODEL,
+        "messages": [{
+            "role": "user",
+            "content": (
+                f"Shorten this commit title to at most {max_length} characters, keeping its leading "
+                f"gitemoji and semantic commit type. Reply with the title only.\n\n{title}"
+            )
+        }]
+    }
+
+    response = _post_completion(_api_headers(), data)
+    try:
+        content = _json_loads(response.read())['choices'][0]['message']['content']
+    finally:
+        response.close()
+    return content.strip().strip('"')
+
+def truncate_title(title, max_length=TITLE_MAX_LENGTH):
+    """Cut a title to max_length at a word boundary, or mid-word if its first word is too long."""
+    if len(title) <= max_length:
+        return title
+    shortened = textwrap.shorten(title, width=max_length, placeholder='…')
+    # shorten() gives back just the placeholder when not even the first word fits
+    if shortened == '…':
+        return title[:max_length - 1] + '…'
+    return shortened
+
+def fit_title(title, max_length=TITLE_MAX_LENGTH):
+    """Return a title within max_length, asking the model to shorten it before cutting it locally."""
+    if len(title) <= max_length:
+        return title
+    try:
+        shorter = request_shorter_title(title, max_length)
+    except Exception:
+        # The local shortening below is always a usable fallback
+        shorter = None
+    # Chatty, multi-line, empty or still overlong replies are ignored in favour of the original
+    if shorter and '\n' not in shorter and len(shorter) <= max_length:
+        return shorter
+    return truncate_title(title, max_length)
+
+def merge_commit_data(results):
+    """Combine per-cluster commit data, prefixing each category with the cluster it came from."""
+    if len(results) == 1:
+        return results[0][1]
+
+    body = {}
+    for cluster, commit_data in results:
+        for category, content in commit_data['body'].items():
+            body[f"{cluster} / {category}"] = content
+
+    return {
+        # Clusters arrive largest first, so the biggest change names the commit
+        'title': results[0][1]['title'],
+        'body': body,
+        'summary': " ".join(commit_data['summary'] for _, commit_data in results),
+    }
+
+async def generate_split_commit_data(diff, changed_files, prompt_diff_max_bytes, on_progress=None, use_cache=True):
+    """Generate one message per top-level directory concurrently and merge them."""
+    clusters = cluster_diff(diff)
+    if not clusters:
+        # No "diff --git" sections to split on, so send the whole diff as a single prompt
+        clusters = [('(root)', changed_files, diff)]
+
+    async def generate(index, files, group_diff):
+        prompt = generate_prompt(summarize_diff(group_diff, max_bytes=prompt_diff_max_bytes), files)
+        # Requests share the pooled client, so they multiplex over one connection when HTTP/2 is available
+        content = await asyncio.to_thread(
+            generate_commit_message, prompt, on_progress if index == 0 else None, use_cache
+        )
+        return _json_loads(content)
+
+    results = await asyncio.gather(*[
+        generate(index, files, group_diff) for index, (_, files, group_diff) in enumerate(clusters)
+    ])
+    return merge_commit_data([(cluster, result) for (cluster, _, _), result in zip(clusters, results)])
+
 def format_commit_message(commit_data):
-    title = commit_data['title'][:50]
+    title = truncate_title(commit_data['title'])
     body = commit_data['body']
     summary = commit_data['summary']
 
-    formatted_message = f"{title}\n\n"
+    # Collect lines and join once instead of growing a string inside the loops
+    lines = [title, ""]
     for category, content in body.items():
-        formatted_message += f"{content['emoji']} {category}:\n"
-        for change in content['changes']:
-            formatted_message += f"- {change}\n"
-        formatted_message += "\n"
-    
-    formatted_message += f"{summary}\n"
+        lines.append(f"{content['emoji']} {category}:")
+        lines.extend(f"- {change}" for change in content['changes'])
+        lines.append("")
+
+    lines.append(summary)
+    lines.append("")
+    return "\n".join(lines)
 
-    return formatted_message
+async def main():
+    parser = argparse.ArgumentParser(description="Generate a commit message for the staged changes.")
+    parser.add_argument('--no-cache', action='store_true', help="Skip the on-disk commit message cache.")
+    parser.add_argument(
+        '--split', action='store_true',
+        help="Generate a message per top-level directory concurrently and combine them."
+    )
+    args = parser.parse_args()
 
-def main():
     # Load environment variables from .env file
     load_dotenv()
 
     console.print("\n[bold magenta]🔮 Analyzing your changes...[/bold magenta]")
     
-    changed_files = get_changed_files()
+    changed_files, diff = await get_staged_changes()
     if not changed_files:
         console.print("\n[bold red]🌚 No changes detected in the staging area.[/bold red]")
         return
 
+    # Only needed once there is something to show
+    from rich.panel import Panel
+    from rich.prompt import Confirm
+    from rich.text import Text
+
     console.print("\n[bold blue]📜 Changes detected in the following files:[/bold blue]")
     for file in changed_files:
-        console.print(f"  - [cyan]{file}[/cyan]")
+        console.print(f"  - [cyan]{escape(file)}[/cyan]")
 
-    diff = get_diff()
-    
     # Get the diff size threshold from environment variables
     diff_size_threshold = int(os.getenv('DIFF_SIZE_THRESHOLD', 1000))
     if len(diff) > diff_size_threshold:
         console.print("\n[bold yellow]⚠️ Warning: The git diff is quite large. Consider making smaller, atomic commits.[/bold yellow]")
 
-    with console.status("[bold green]Generating commit message using GPT-4O...[/bold green]"):
+    prompt_diff_max_bytes = int(os.getenv('PROMPT_DIFF_MAX_BYTES', 8192))
+
+    status_message = "[bold green]Generating commit message using GPT-4O...[/bold green]"
+    with console.status(status_message) as status:
+        def show_progress(text):
+            match = _PARTIAL_TITLE_RE.search(text)
+            if match:
+                status.update(f"{status_message} [cyan]{escape(match.group(1))}[/cyan]")
+
         try:
-            commit_message_json = generate_commit_message(generate_prompt(diff, changed_files))
-            commit_data = json.loads(commit_message_json)
+            if args.split:
+                commit_data = await generate_split_commit_data(
+                    diff, changed_files, prompt_diff_max_bytes, on_progress=show_progress, use_cache=not args.no_cache
+                )
+            else:
+                commit_message_json = generate_commit_message(
+                    generate_prompt(summarize_diff(diff, max_bytes=prompt_diff_max_bytes), changed_files), on_progress=show_progress, use_cache=not args.no_cache
+                )
+                commit_data = _json_loads(commit_message_json)
+            # Titles are fitted before caching; this only guards entries cached before that
+            commit_data['title'] = truncate_title(commit_data['title'])
             formatted_message = format_commit_message(commit_data)
         except json.JSONDecodeError:
             console.print("[bold red]Error: Failed to parse the generated commit message as JSON.[/bold red]")
@@ -139,14 +637,16 @@ def main():
     console.print("\n[bold green]📝 Generated Commit Message:[/bold green]")
     console.print(Panel(Text(formatted_message), expand=False, border_style="green"))
 
-    git_command = f'git commit -m "{commit_data["title"]}" -m "{formatted_message}"'
+    git_args = ['git', 'commit', '-m', commit_data['title'], '-m', formatted_message]
+    # Quoted form is only for display; the commit itself runs without a shell
+    git_command = shlex.join(git_args)
     
     console.print("\n[bold yellow]🚀 Generated Git Command:[/bold yellow]")
-    console.print(Panel(Syntax(git_command, "bash", theme="monokai", line_numbers=True)))
+    console.print(Panel(Text(git_command), title="git", border_style="yellow"))
 
     if Confirm.ask("Do you want to execute this git command?"):
         try:
-            subprocess.run(git_command, shell=True, check=True)
+            subprocess.run(git_args, check=True)
             console.print("\n[bold green]✨ Commit executed successfully![/bold green]")
         except subprocess.CalledProcessError:
             console.print("\n[bold red]❌ Failed to execute the commit command. Please check the generated message and try manually.[/bold red]")
@@ -156,4 +656,4 @@ def main():
     console.print("\n[bold magenta]✨ Process completed.[/bold magenta]")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file